@@ -1,6 +1,6 @@
 import { type NextRequest, NextResponse } from "next/server"
 import * as path from "path"
-import { spawn } from "child_process"
+import { callPythonWorker } from "@/lib/python-worker"
 
 interface AnalyzeRequest {
   uttId: string
@@ -31,39 +31,19 @@ export async function POST(request: NextRequest) {
     const dataRoot = process.env.DATA_ROOT || path.join(process.cwd(), "loudspeaker_asr_dataset")
     const pythonPath = path.join(process.cwd(), "venv", "bin", "python")
 
-    const pythonProcess = spawn(pythonPath, [path.join(process.cwd(), "scripts", "analyze.py")])
-
-    let output = ""
-    let errorOutput = ""
-
-    pythonProcess.stdout.on("data", (data) => {
-      output += data.toString()
-    })
-
-    pythonProcess.stderr.on("data", (data) => {
-      errorOutput += data.toString()
-    })
-
     const requestData = {
       ...body,
       dataRoot,
     }
 
-    pythonProcess.stdin.write(JSON.stringify(requestData))
-    pythonProcess.stdin.end()
-
-    await new Promise<void>((resolve, reject) => {
-      pythonProcess.on("close", (code) => {
-        if (code !== 0) {
-          reject(new Error(`Python process exited with code ${code}: ${errorOutput}`))
-        } else {
-          resolve()
-        }
-      })
-      pythonProcess.on("error", reject)
-    })
+    // Persistent worker: Whisper stays loaded between requests
+    const { stdout } = await callPythonWorker(
+      pythonPath,
+      path.join(process.cwd(), "scripts", "analyze.py"),
+      requestData,
+    )
 
-    const result: AnalyzeResponse = JSON.parse(output)
+    const result: AnalyzeResponse = JSON.parse(stdout)
     return NextResponse.json(result)
   } catch (error) {
     console.error("[API] Analyze error:", error)
@@ -1,13 +1,11 @@
 import { type NextRequest, NextResponse } from "next/server"
 import * as path from "path"
-import { spawn } from "child_process"
+import { callPythonWorker } from "@/lib/python-worker"
 
 export const runtime = "nodejs"
 export const dynamic = "force-dynamic"
 
 export async function POST(request: NextRequest) {
-  let pythonProcess: ReturnType<typeof spawn> | null = null
-
   try {
     const body = await request.json()
 
@@ -38,35 +36,16 @@ export async function POST(request: NextRequest) {
       dataRoot,
     }
 
-    pythonProcess = spawn(pythonBin, [scriptPath], {
-      cwd: process.cwd(),
-      env: { ...process.env, DATA_ROOT: dataRoot, VOSK_PATH: voskPath },
-      stdio: ["pipe", "pipe", "pipe"],
-    })
-
-    if (!pythonProcess.stdin || !pythonProcess.stdout || !pythonProcess.stderr) {
-      return NextResponse.json(
-        { error: "Failed to start python process with piped stdio." },
-        { status: 500 }
-      )
-    }
-
-    let stdoutData = ""
-    let stderrData = ""
-
-    pythonProcess.stdout.setEncoding("utf8")
-    pythonProcess.stderr.setEncoding("utf8")
-
-    pythonProcess.stdout.on("data", (chunk) => (stdoutData += chunk))
-    pythonProcess.stderr.on("data", (chunk) => (stderrData += chunk))
-
-    pythonProcess.stdin.write(JSON.stringify(requestData))
-    pythonProcess.stdin.end()
-
-    await new Promise<void>((resolve, reject) => {
-      pythonProcess!.on("close", () => resolve())
-      pythonProcess!.on("error", reject)
-    })
+    // Worker persistant : les modèles ASR restent chargés entre les requêtes
+    const { stdout: stdoutData, stderr: stderrData } = await callPythonWorker(
+      pythonBin,
+      scriptPath,
+      requestData,
+      {
+        cwd: process.cwd(),
+        env: { ...process.env, DATA_ROOT: dataRoot, VOSK_PATH: voskPath },
+      },
+    )
 
     // stdout doit être JSON
     let result: any
@@ -97,9 +76,5 @@ export async function POST(request: NextRequest) {
     return NextResponse.json(result)
   } catch (e: any) {
     return NextResponse.json({ error: e?.message || "Unknown error" }, { status: 500 })
-  } finally {
-    try {
-      pythonProcess?.kill("SIGKILL")
-    } catch {}
   }
 }
@@ -0,0 +1,112 @@
+import { spawn, type ChildProcessWithoutNullStreams, type SpawnOptionsWithoutStdio } from "child_process"
+import * as readline from "readline"
+
+/**
+ * Long-lived Python backend process.
+ * The script is spawned once and kept alive: each request is one JSON line on its
+ * stdin carrying an `id`, each response one JSON line on its stdout echoing that `id`,
+ * so the ASR models are loaded only on the first call instead of on every API request.
+ */
+
+export interface PythonWorkerResponse {
+  stdout: string // one JSON line
+  stderr: string // stderr written since the previous response
+}
+
+interface PendingRequest {
+  resolve: (response: PythonWorkerResponse) => void
+  reject: (error: Error) => void
+  timer: ReturnType<typeof setTimeout>
+}
+
+interface PythonWorker {
+  proc: ChildProcessWithoutNullStreams
+  pending: Map<number, PendingRequest>
+  nextId: number
+  stderr: string
+}
+
+const MAX_STDERR = 64 * 1024
+// Per request, model loading on the first call included
+const DEFAULT_TIMEOUT_MS = Number(process.env.PYTHON_WORKER_TIMEOUT_MS) || 15 * 60 * 1000
+
+// Kept on globalThis so Next.js dev reloads reuse the running workers
+const globalForWorkers = globalThis as unknown as { pythonWorkers?: Map<string, PythonWorker> }
+const workers = (globalForWorkers.pythonWorkers ??= new Map<string, PythonWorker>())
+
+function startWorker(key: string, pythonBin: string, scriptPath: string, options: SpawnOptionsWithoutStdio) {
+  const proc = spawn(pythonBin, [scriptPath], options)
+  const worker: PythonWorker = { proc, pending: new Map(), nextId: 1, stderr: "" }
+
+  proc.stdout.setEncoding("utf8")
+  proc.stderr.setEncoding("utf8")
+
+  proc.stderr.on("data", (chunk: string) => {
+    worker.stderr = (worker.stderr + chunk).slice(-MAX_STDERR)
+  })
+
+  // Responses are matched by id; anything else on stdout is skipped
+  readline.createInterface({ input: proc.stdout }).on("line", (line) => {
+    let id: unknown
+    try {
+      id = JSON.parse(line)?.id
+    } catch {
+      console.warn("[python-worker] skipping non-JSON stdout line:", line.slice(0, 200))
+      return
+    }
+    const request = typeof id === "number" ? worker.pending.get(id) : undefined
+    if (!request) return
+    worker.pending.delete(id as number)
+    clearTimeout(request.timer)
+    const stderr = worker.stderr
+    worker.stderr = ""
+    request.resolve({ stdout: line, stderr })
+  })
+
+  const fail = (error: Error) => {
+    if (workers.get(key) === worker) workers.delete(key)
+    for (const request of worker.pending.values()) {
+      clearTimeout(request.timer)
+      request.reject(error)
+    }
+    worker.pending.clear()
+  }
+
+  proc.on("error", fail)
+  proc.stdin.on("error", fail)
+  proc.on("close", (code) => {
+    fail(new Error(`Python process exited with code ${code}: ${worker.stderr}`))
+  })
+
+  workers.set(key, worker)
+  return worker
+}
+
+/**
+ * Send one request to the persistent worker for `scriptPath`, starting it if needed.
+ * `options` (cwd, env) only apply when the process is spawned. A request still
+ * unanswered after `timeoutMs` kills the worker; the next call starts a fresh one.
+ */
+export function callPythonWorker(
+  pythonBin: string,
+  scriptPath: string,
+  payload: object,
+  options: SpawnOptionsWithoutStdio = {},
+  timeoutMs: number = DEFAULT_TIMEOUT_MS,
+): Promise<PythonWorkerResponse> {
+  const key = `${pythonBin}\n${scriptPath}`
+  const worker = workers.get(key) ?? startWorker(key, pythonBin, scriptPath, options)
+  const id = worker.nextId++
+
+  return new Promise((resolve, reject) => {
+    const timer = setTimeout(() => {
+      worker.pending.delete(id)
+      reject(new Error(`Python worker timed out after ${timeoutMs} ms: ${worker.stderr}`))
+      // The process is stuck on this request, and later ones would queue behind it
+      if (workers.get(key) === worker) workers.delete(key)
+      worker.proc.kill()
+    }, timeoutMs)
+    worker.pending.set(id, { resolve, reject, timer })
+    worker.proc.stdin.write(JSON.stringify({ ...payload, id }) + "\n")
+  })
+}
@@ -5,22 +5,38 @@ Called by POST /api/analyze
 Compatible with macOS Apple Silicon (M1 / M2)
 """
 
-import json
 import sys
 import os
+import copy
 import base64
+import struct
 import subprocess
+from concurrent.futures import ThreadPoolExecutor
+from worker_io import redirect_stdout, serve
+
+if __name__ == "__main__":
+    # Before the heavy imports: only responses may reach stdout
+    RESPONSE_OUT = redirect_stdout()
+
 import numpy as np
-import librosa
 import soundfile as sf
+import soxr
 import torch
+from scipy.fft import rfft, irfft, rfftfreq, next_fast_len
+from scipy.signal import get_window
 from transformers import WhisperProcessor, WhisperForConditionalGeneration
+from dataset_metadata import load_metadata
 
 # -------------------------
 # Config
 # -------------------------
 TARGET_SR = 16000
 MODEL_NAME = "openai/whisper-small"
+# Whisper weights: int8 (dynamic quantization, CPU only) | nf4 | fp32
+WHISPER_QUANT = os.environ.get("WHISPER_QUANT", "int8").lower()
+
+# Inference only
+torch.set_grad_enabled(False)
 
 # Apple Silicon safe device
 DEVICE = "mps" if torch.backends.mps.is_available() else "cpu"
@@ -37,18 +53,38 @@ model = WhisperForConditionalGeneration.from_pretrained(
 ).to(DEVICE)
 model.eval()
 
+# Dynamic int8 quantization of the Linear layers (CPU only, MPS stays float32).
+# nf4 has no CPU kernel, so it falls back to int8 here.
+WHISPER_WEIGHTS = "float32"
+if DEVICE == "cpu" and WHISPER_QUANT != "fp32":
+    model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    WHISPER_WEIGHTS = "dynamic-int8"
+print(f"Whisper weights: {WHISPER_WEIGHTS} (WHISPER_QUANT={WHISPER_QUANT})", file=sys.stderr)
+
 forced_decoder_ids = processor.get_decoder_prompt_ids(
     language="en",
     task="transcribe"
 )
 
+# Greedy decoding config, built once (copied from the model to keep Whisper's token ids)
+gen_config = copy.deepcopy(model.generation_config)
+gen_config.update(
+    max_new_tokens=64,
+    num_beams=1,
+    do_sample=False,
+    use_cache=True,
+    pad_token_id=processor.tokenizer.pad_token_id,
+)
+if forced_decoder_ids is not None:
+    gen_config.forced_decoder_ids = forced_decoder_ids
+
 # -------------------------
 # Optional dependency (safe)
 # -------------------------
 try:
-    import editdistance
+    from token_distance import levenshtein, char_ids, word_ids
 except ImportError:
-    editdistance = None
+    levenshtein = None
 
 # -------------------------
 # EQ profiles
@@ -62,6 +98,13 @@ EQ_PROFILES_DB = {
     "classic": [1,1,0,-1,-2,-3],
 }
 
+# Band edges and per-mode linear gains (dB -> linéaire), 1.0 above the last band
+EQ_EDGES = np.array([b[0] for b in EQ_BANDS] + [EQ_BANDS[-1][1]], dtype=np.float32)
+EQ_GAIN_LUT = {
+    mode: np.append(10 ** (np.array(gains_db) / 20.0), 1.0).astype(np.float32)
+    for mode, gains_db in EQ_PROFILES_DB.items()
+}
+
 # -------------------------
 # Helper functions
 # -------------------------
@@ -70,33 +113,42 @@ def safe_read_audio(path, target_sr=TARGET_SR):
     if isinstance(y, np.ndarray) and y.ndim > 1:
         y = y.mean(axis=1)
     if sr != target_sr:
-        y = librosa.resample(y, orig_sr=sr, target_sr=target_sr)
+        y = soxr.resample(y, sr, target_sr, quality="HQ")
     return y.astype(np.float32), int(target_sr)
 
 def rms(y):
     return float(np.sqrt(np.mean(y**2) + 1e-12))
 
-def spectral_centroid_rolloff(y, sr):
-    centroid = float(np.mean(librosa.feature.spectral_centroid(y=y, sr=sr)))
-    rolloff = float(np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr, roll_percent=0.85)))
-    return centroid, rolloff
+def spectral_frames(y, n_fft=2048, hop=512):
+    """Hann-windowed, centered STFT frames (same framing as librosa's defaults)."""
+    y = np.pad(np.asarray(y, dtype=np.float32), n_fft // 2)
+    frames = np.lib.stride_tricks.sliding_window_view(y, n_fft)[::hop]
+    return frames * get_window("hann", n_fft).astype(np.float32)
+
+def spectral_centroid_rolloff(y, sr, n_fft=2048, hop=512, roll_percent=0.85):
+    # One magnitude STFT shared by both features
+    S = np.abs(np.fft.rfft(spectral_frames(y, n_fft, hop), axis=-1))
+    freqs = np.fft.rfftfreq(n_fft, 1/sr)
+    energy = S.sum(axis=-1)
+    centroid = (S @ freqs) / np.maximum(energy, 1e-12)
+    cum = np.cumsum(S, axis=-1)
+    rolloff = freqs[(cum >= roll_percent * energy[:, None]).argmax(axis=-1)]
+    return float(centroid.mean()), float(rolloff.mean())
 
 def apply_equalizer(y, sr, mode="none"):
-    gains_db = EQ_PROFILES_DB.get(mode, [0,0,0,0,0,0])
     if mode == "none":
         return y
-    # Transform dB -> linéaire
-    gains_lin = 10 ** (np.array(gains_db) / 20.0)
-    # FFT
-    Y = np.fft.rfft(y)
-    freqs = np.fft.rfftfreq(len(y), 1/sr)
-    G = np.ones_like(freqs)
-    for (fmin, fmax), g in zip(EQ_BANDS, gains_lin):
-        idx = (freqs >= fmin) & (freqs < fmax)
-        G[idx] *= g
+    gains_lin = EQ_GAIN_LUT.get(mode, EQ_GAIN_LUT["none"])
+    # FFT (multithread, taille rapide >= len(y))
+    n = next_fast_len(len(y), real=True)
+    Y = rfft(y, n=n, workers=-1)
+    freqs = rfftfreq(n, 1/sr)
+    # Bande de chaque fréquence -> gain (la dernière entrée couvre >= 8000 Hz)
+    idx = np.searchsorted(EQ_EDGES, freqs, side="right") - 1
+    np.clip(idx, 0, len(gains_lin) - 1, out=idx)
     # Appliquer EQ
-    Y_eq = Y * G
-    y_eq = np.fft.irfft(Y_eq)
+    Y *= gains_lin[idx]
+    y_eq = irfft(Y, n=n, workers=-1)[:len(y)]
     return y_eq.astype(np.float32)
 
    
@@ -105,29 +157,35 @@ def normalize_text(s):
     return " ".join(str(s).lower().strip().split())
 
 def cer(ref, hyp):
-    if editdistance is None:
+    if levenshtein is None:
         return 0.0
     ref_n = normalize_text(ref)
     hyp_n = normalize_text(hyp)
-    return editdistance.eval(ref_n, hyp_n) / max(1, len(ref_n))
+    return levenshtein(char_ids(ref_n), char_ids(hyp_n)) / max(1, len(ref_n))
 
 def wer(ref, hyp):
-    if editdistance is None:
+    if levenshtein is None:
         return 0.0
     ref_w = normalize_text(ref).split()
     hyp_w = normalize_text(hyp).split()
-    return editdistance.eval(ref_w, hyp_w) / max(1, len(ref_w))
+    return levenshtein(*word_ids(ref_w, hyp_w)) / max(1, len(ref_w))
 
 def audio_to_base64(y, sr):
-    import io
-    buf = io.BytesIO()
-    sf.write(buf, y, sr, format="WAV")
-    buf.seek(0)
-    return base64.b64encode(buf.read()).decode()
+    # Mono PCM16 WAV: 44-byte RIFF header + int16 samples, no libsndfile round-trip
+    pcm = np.clip(np.rint(np.asarray(y, dtype=np.float32) * 32767), -32768, 32767).astype("<i2").tobytes()
+    header = struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + len(pcm), b"WAVE",
+        b"fmt ", 16, 1, 1, sr, sr * 2, 2, 16,
+        b"data", len(pcm),
+    )
+    return base64.b64encode(header + pcm).decode()
 
 # -------------------------
 # Fix mislabeled speaker_0m files
 # -------------------------
+_fixed_data_roots = set()
+
 def fix_speaker0m_files(data_root):
     speaker0_dir = os.path.join(data_root, "audio", "speaker_0m")
     if not os.path.isdir(speaker0_dir):
@@ -136,55 +194,62 @@ def fix_speaker0m_files(data_root):
 
     def file_type(path):
         try:
-            out = subprocess.check_output(["bash", "-lc", f'file -b "{path}"'], text=True).strip()
-            return out
+            return subprocess.check_output(["file", "-b", path], text=True).strip()
         except Exception:
             return "unknown"
 
     def convert_to_wav_pcm(in_path, out_path):
-        cmd = f'ffmpeg -y -hide_banner -loglevel error -i "{in_path}" -ac 1 -ar {TARGET_SR} -c:a pcm_s16le "{out_path}"'
-        subprocess.check_call(["bash","-lc", cmd])
-
-    bad = []
-    for fn in sorted(os.listdir(speaker0_dir)):
-        if not fn.lower().endswith(".wav"):
-            continue
-        p = os.path.join(speaker0_dir, fn)
-        t = file_type(p)
-        if any(x in t for x in ["ISO Media", "M4A", "MP4", "AAC", "Apple iTunes"]):
-            bad.append((p, t))
-    if bad:
-        print(f"⚠️ {len(bad)} fichier(s) speaker_0m sont en réalité M4A/AAC. Conversion en WAV PCM...", file=sys.stderr)
-        for p, t in bad:
-            tmp_out = p + ".fixed.wav"
-            convert_to_wav_pcm(p, tmp_out)
-            os.replace(tmp_out, p)
-        print("✅ Conversion terminée. speaker_0m est maintenant WAV correct.", file=sys.stderr)
-    else:
-        print("✅ speaker_0m est déjà un WAV correct (pas de conversion nécessaire).", file=sys.stderr)
+        subprocess.check_call([
+            "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+            "-i", in_path, "-ac", "1", "-ar", str(TARGET_SR), "-c:a", "pcm_s16le", out_path,
+        ])
+
+    def fix_file(path):
+        tmp_out = path + ".fixed.wav"
+        convert_to_wav_pcm(path, tmp_out)
+        os.replace(tmp_out, path)
+
+    paths = [
+        os.path.join(speaker0_dir, fn)
+        for fn in sorted(os.listdir(speaker0_dir))
+        if fn.lower().endswith(".wav")
+    ]
+    # One process per file: run the scans and conversions concurrently
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 4) as pool:
+        types = list(pool.map(file_type, paths))
+        bad = [
+            (p, t) for p, t in zip(paths, types)
+            if any(x in t for x in ["ISO Media", "M4A", "MP4", "AAC", "Apple iTunes"])
+        ]
+        if bad:
+            print(f"⚠️ {len(bad)} fichier(s) speaker_0m sont en réalité M4A/AAC. Conversion en WAV PCM...", file=sys.stderr)
+            list(pool.map(fix_file, [p for p, _ in bad]))
+            print("✅ Conversion terminée. speaker_0m est maintenant WAV correct.", file=sys.stderr)
+        else:
+            print("✅ speaker_0m est déjà un WAV correct (pas de conversion nécessaire).", file=sys.stderr)
 
 # -------------------------
 # Main analysis
 # -------------------------
 def run_analysis(utt_id, eq_mode, do_eq, transcribe_on, transcriber_cond, data_root):
-    import pandas as pd
-
-    # Fix mislabeled files first
-    fix_speaker0m_files(data_root)
+    # Fix mislabeled files first (once per data_root in a long-running worker)
+    if data_root not in _fixed_data_roots:
+        fix_speaker0m_files(data_root)
+        _fixed_data_roots.add(data_root)
 
-    logs = []
+    logs = [f"[config] whisper={MODEL_NAME} device={DEVICE} weights={WHISPER_WEIGHTS} WHISPER_QUANT={WHISPER_QUANT}"]
 
     try:
         meta_path = os.path.join(data_root, "metadata.csv")
         if not os.path.exists(meta_path):
             return {"error": f"Metadata file not found: {meta_path}"}
 
-        df = pd.read_csv(meta_path)
-        df["abspath"] = df["relpath"].apply(lambda p: os.path.join(data_root, p))
+        df = load_metadata(data_root, meta_path)
+        utt_rows = df.query("utt_id == @utt_id")
 
         outs = {}
         for cond in ["human", "speaker_0m", "speaker_3m"]:
-            rows = df[(df.utt_id == utt_id) & (df.condition == cond)]
+            rows = utt_rows[utt_rows.condition == cond]
             if rows.empty:
                 logs.append(f"[WARN] No row for {cond}")
                 continue
@@ -230,16 +295,7 @@ def run_analysis(utt_id, eq_mode, do_eq, transcribe_on, transcriber_cond, data_r
 
             feats = inputs.input_features.to(DEVICE)
 
-            gen_kwargs = {}
-            if forced_decoder_ids is not None:
-                gen_kwargs["forced_decoder_ids"] = forced_decoder_ids
-
-            with torch.no_grad():
-                pred_ids = model.generate(
-                    feats,
-                    max_new_tokens=64,
-                    **gen_kwargs
-                )
+            pred_ids = model.generate(feats, generation_config=gen_config)
 
             pred_text = processor.batch_decode(
                 pred_ids,
@@ -285,13 +341,17 @@ def run_analysis(utt_id, eq_mode, do_eq, transcribe_on, transcriber_cond, data_r
 # Entry point
 # -------------------------
 if __name__ == "__main__":
-    input_data = json.load(sys.stdin)
-    result = run_analysis(
-        input_data.get("uttId", ""),
-        input_data.get("eqMode", "none"),
-        input_data.get("doEq", False),
-        input_data.get("transcribeOn", False),
-        input_data.get("transcriberCond", "human"),
-        input_data.get("dataRoot", os.getcwd())
-    )
-    print(json.dumps(result))
+    # Persistent worker: one JSON request per line on stdin, one JSON response per line
+    # on stdout, tagged with the request "id". The model above is loaded once and
+    # serves requests until stdin closes.
+    def handle(input_data):
+        return run_analysis(
+            input_data.get("uttId", ""),
+            input_data.get("eqMode", "none"),
+            input_data.get("doEq", False),
+            input_data.get("transcribeOn", False),
+            input_data.get("transcriberCond", "human"),
+            input_data.get("dataRoot", os.getcwd())
+        )
+
+    serve(handle, RESPONSE_OUT)
@@ -0,0 +1,33 @@
+"""
+metadata.csv loading shared by analyze.py and evaluate.py.
+"""
+
+import os
+
+META_COLUMNS = ["utt_id", "condition", "relpath", "text", "distance_m"]
+REQUIRED_COLUMNS = ["utt_id", "condition", "relpath"]
+_metadata_cache = {}
+
+def load_metadata(data_root, meta_path):
+    """Parse metadata.csv once per (data_root, path, mtime); callers must not mutate the result.
+    Raises ValueError naming the missing required columns and the file's actual header."""
+    import pandas as pd
+
+    key = (data_root, meta_path, os.path.getmtime(meta_path))
+    df = _metadata_cache.get(key)
+    if df is None:
+        # Validate the real header: usecols below drops every unknown column
+        header = list(pd.read_csv(meta_path, nrows=0).columns)
+        missing = [c for c in REQUIRED_COLUMNS if c not in header]
+        if missing:
+            raise ValueError(f"metadata.csv missing required columns {missing}. Found: {header}")
+
+        df = pd.read_csv(
+            meta_path,
+            usecols=lambda c: c in META_COLUMNS,
+            dtype={"utt_id": "string", "condition": "category"},
+        )
+        df["abspath"] = (data_root + os.sep + df["relpath"].astype(str)).values
+        _metadata_cache.clear()
+        _metadata_cache[key] = df
+    return df
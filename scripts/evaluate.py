@@ -10,32 +10,52 @@ JSON-safe output for frontend consumption
 # =====================
 # SILENCE WARNINGS
 # =====================
-import os, warnings
+import os, sys, warnings
 warnings.filterwarnings("ignore")
 os.environ["TF_CPP_MIN_LOG_LEVEL"] = "3"
 os.environ["TRANSFORMERS_NO_ADVISORY_WARNINGS"] = "1"
 os.environ["VOSK_LOG_LEVEL"] = "-1"
 
+from worker_io import redirect_stdout, serve
+
+if __name__ == "__main__":
+    # Before the heavy imports: only responses may reach stdout
+    RESPONSE_OUT = redirect_stdout()
+
 # =====================
 # IMPORTS
 # =====================
-import json, sys, base64, io
+import json, base64, io, hashlib, copy
+from concurrent.futures import ThreadPoolExecutor
 import numpy as np
 import pandas as pd
-import librosa
 import soundfile as sf
+import soxr
 import torch
-import editdistance
-from scipy.signal import butter, lfilter
+from scipy.signal import butter, sosfilt, get_window
+from token_distance import levenshtein, char_ids, word_ids
+from dataset_metadata import load_metadata
 
-import matplotlib
-matplotlib.use("Agg")
-import matplotlib.pyplot as plt
+from PIL import Image, ImageDraw, ImageFont
 
 # =====================
 # CONFIG
 # =====================
 TARGET_SR = 16000
+ASR_BATCH_SIZE = int(os.environ.get("ASR_BATCH_SIZE", "8"))
+# Worker threads for audio loading, EQ and spectral features
+PREP_WORKERS = min(8, os.cpu_count() or 1)
+# Whisper log-mel disk cache, opt-in: MEL_CACHE_DIR (relative paths are taken from this
+# script's directory), oldest entries evicted beyond MEL_CACHE_MAX_MB
+MEL_CACHE_DIR = os.environ.get("MEL_CACHE_DIR", "")
+if MEL_CACHE_DIR:
+    MEL_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), MEL_CACHE_DIR)
+MEL_CACHE_MAX_MB = float(os.environ.get("MEL_CACHE_MAX_MB", "512"))
+# torch.compile for the Transformers models, opt-in with TORCH_COMPILE=1
+TORCH_COMPILE = os.environ.get("TORCH_COMPILE", "0") == "1"
+
+# Inference only: no autograd graph anywhere in this script
+torch.set_grad_enabled(False)
 
 # Device: prefer CUDA, then MPS, else CPU
 if torch.cuda.is_available():
@@ -45,6 +65,11 @@ elif torch.backends.mps.is_available():
 else:
     DEVICE = "cpu"
 
+# Half precision on CUDA; MPS and CPU stay float32
+MODEL_DTYPE = torch.float16 if DEVICE == "cuda" else torch.float32
+AUTOCAST_DEVICE = "cuda" if DEVICE == "cuda" else "cpu"
+USE_AUTOCAST = MODEL_DTYPE != torch.float32
+
 # =====================
 # LOAD ASR MODELS
 # =====================
@@ -52,21 +77,121 @@ from transformers import WhisperProcessor, WhisperForConditionalGeneration
 from transformers import Wav2Vec2Processor, Wav2Vec2ForCTC
 from vosk import Model as VoskModel, KaldiRecognizer
 
+# faster-whisper (CTranslate2) is used for Whisper when installed;
+# WHISPER_BACKEND=hf forces the Transformers path.
+try:
+    from faster_whisper import WhisperModel as FasterWhisperModel
+except ImportError:
+    FasterWhisperModel = None
+
 # Whisper
 WHISPER_NAME = "openai/whisper-small"
-whisper_processor = WhisperProcessor.from_pretrained(WHISPER_NAME)
-whisper_model = WhisperForConditionalGeneration.from_pretrained(WHISPER_NAME).to(DEVICE).eval()
-forced_ids = whisper_processor.get_decoder_prompt_ids(language="en", task="transcribe")
+# Whisper weights: int8 (default) | nf4 | fp32
+WHISPER_QUANT = os.environ.get("WHISPER_QUANT", "int8").lower()
+# fp32 keeps Whisper in float32 (no autocast) even on CUDA
+WHISPER_DTYPE = torch.float32 if WHISPER_QUANT == "fp32" else MODEL_DTYPE
+WHISPER_AUTOCAST = WHISPER_DTYPE != torch.float32
+
+def load_whisper(name):
+    """Load the Transformers Whisper model; returns (model, description of the weights actually used)."""
+    fallback = ""
+    # CUDA: int8 / nf4 weights through bitsandbytes
+    if DEVICE == "cuda" and WHISPER_QUANT in ("int8", "nf4"):
+        from transformers import BitsAndBytesConfig
+        if WHISPER_QUANT == "int8":
+            bnb_config = BitsAndBytesConfig(load_in_8bit=True)
+        else:
+            bnb_config = BitsAndBytesConfig(
+                load_in_4bit=True,
+                bnb_4bit_quant_type="nf4",
+                bnb_4bit_compute_dtype=torch.float16,
+            )
+        try:
+            model = WhisperForConditionalGeneration.from_pretrained(
+                name, quantization_config=bnb_config, device_map="auto", torch_dtype=WHISPER_DTYPE
+            ).eval()
+            return model, f"bitsandbytes-{WHISPER_QUANT}"
+        except ImportError as ex:
+            print(f"[whisper] bitsandbytes unavailable, using unquantized weights: {ex}", file=sys.stderr)
+            fallback = " (bitsandbytes unavailable)"
+
+    model = WhisperForConditionalGeneration.from_pretrained(name, torch_dtype=WHISPER_DTYPE).to(DEVICE).eval()
+
+    # CPU: dynamic int8 quantization of the Linear layers (nf4 has no CPU kernel)
+    if DEVICE == "cpu" and WHISPER_QUANT != "fp32":
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        return model, "dynamic-int8"
+    return model, str(WHISPER_DTYPE).replace("torch.", "") + fallback
+
+FASTER_WHISPER_NAME = "small"
+USE_FASTER_WHISPER = (
+    FasterWhisperModel is not None
+    and os.environ.get("WHISPER_BACKEND", "faster").lower() != "hf"
+)
+
+if USE_FASTER_WHISPER:
+    # CTranslate2 has no MPS backend; fp8 is not supported, int8_float16 is the CUDA choice
+    fw_device = "cuda" if DEVICE == "cuda" else "cpu"
+    if WHISPER_QUANT == "fp32":
+        fw_compute_type = "float32"
+    else:
+        fw_compute_type = "int8_float16" if fw_device == "cuda" else "int8"
+    whisper_model = FasterWhisperModel(FASTER_WHISPER_NAME, device=fw_device, compute_type=fw_compute_type)
+    WHISPER_ENGINE = f"faster-whisper:{FASTER_WHISPER_NAME} device={fw_device} compute_type={fw_compute_type}"
+    whisper_processor = None
+    forced_ids = None
+    whisper_gen_config = None
+else:
+    whisper_processor = WhisperProcessor.from_pretrained(WHISPER_NAME)
+    whisper_model, whisper_weights = load_whisper(WHISPER_NAME)
+    WHISPER_ENGINE = f"transformers:{WHISPER_NAME} device={DEVICE} weights={whisper_weights}"
+    forced_ids = whisper_processor.get_decoder_prompt_ids(language="en", task="transcribe")
+    # Greedy decoding, built once instead of merging generate() kwargs on every call.
+    # Starts from the model's own config to keep the Whisper-specific token ids.
+    whisper_gen_config = copy.deepcopy(whisper_model.generation_config)
+    whisper_gen_config.update(
+        max_new_tokens=64,
+        num_beams=1,
+        do_sample=False,
+        use_cache=True,
+        forced_decoder_ids=forced_ids,
+        pad_token_id=whisper_processor.tokenizer.pad_token_id,
+    )
+
+# Whisper features on CUDA: reused pinned host buffer + device buffer, both in WHISPER_DTYPE
+# so the async H2D copy is a plain copy (any fp16 cast happens in np.stack on the host)
+if DEVICE == "cuda" and not USE_FASTER_WHISPER:
+    fe = whisper_processor.feature_extractor
+    feat_host = torch.empty((ASR_BATCH_SIZE, fe.feature_size, fe.nb_max_frames), dtype=WHISPER_DTYPE, pin_memory=True)
+    feat_dev = torch.empty_like(feat_host, device=DEVICE)
+else:
+    feat_host = feat_dev = None
 
 # Wav2Vec2
 W2V_NAME = "facebook/wav2vec2-base-960h"
 w2v_processor = Wav2Vec2Processor.from_pretrained(W2V_NAME)
-w2v_model = Wav2Vec2ForCTC.from_pretrained(W2V_NAME).to(DEVICE).eval()
+w2v_model = Wav2Vec2ForCTC.from_pretrained(W2V_NAME, torch_dtype=MODEL_DTYPE).to(DEVICE).eval()
 
 # Vosk
 VOSK_PATH = os.environ.get("VOSK_PATH", "models/vosk-model-small-en-us-0.15")
 vosk_model = VoskModel(VOSK_PATH)
 
+# One KaldiRecognizer per sample rate, reset between utterances instead of rebuilt
+_vosk_recs = {}
+
+def get_vosk_rec(sr):
+    rec = _vosk_recs.get(sr)
+    if rec is None:
+        rec = KaldiRecognizer(vosk_model, sr)
+        rec.SetWords(False)
+        _vosk_recs[sr] = rec
+    else:
+        rec.Reset()
+    return rec
+
+# load_audio always returns TARGET_SR: build that recognizer up front
+get_vosk_rec(TARGET_SR)
+
 # =====================
 # AUDIO UTILITIES
 # =====================
@@ -86,7 +211,7 @@ def load_audio(path, logs):
 
     if sr != TARGET_SR:
         try:
-            y = librosa.resample(y, orig_sr=sr, target_sr=TARGET_SR)
+            y = soxr.resample(y, sr, TARGET_SR, quality="HQ")
             sr = TARGET_SR
         except Exception as ex:
             logs.append(f"[resample] failed (sr={sr}): {ex}")
@@ -95,42 +220,86 @@ def load_audio(path, logs):
 
     return y.astype(np.float32), sr
 
-def rms(y):
-    return float(np.sqrt(np.mean(y**2) + 1e-12))
-
-def spectral_features(y, sr):
-    if y is None or len(y) == 0:
-        return 0.0, 0.0
-    c = np.mean(librosa.feature.spectral_centroid(y=y, sr=sr))
-    r = np.mean(librosa.feature.spectral_rolloff(y=y, sr=sr))
-    return float(c), float(r)
+def pad_stack(ys, dtype):
+    """Stack clips of different lengths into one zero-padded (n_clips, max_len) array."""
+    out = np.zeros((len(ys), max(len(y) for y in ys)), dtype=dtype)
+    for i, y in enumerate(ys):
+        out[i, :len(y)] = y
+    return out
+
+def rms_batch(ys):
+    lens = np.array([len(y) for y in ys])
+    Y = pad_stack(ys, np.result_type(*ys))
+    power = (Y * Y).sum(axis=1, dtype=np.float64) / np.maximum(lens, 1)
+    return np.sqrt(power + 1e-12)
+
+def spectral_frames(y, n_fft=2048, hop=512):
+    """Hann-windowed, centered STFT frames along the last axis (same framing as librosa's defaults)."""
+    y = np.asarray(y, dtype=np.float32)
+    y = np.pad(y, [(0, 0)] * (y.ndim - 1) + [(n_fft // 2, n_fft // 2)])
+    frames = np.lib.stride_tricks.sliding_window_view(y, n_fft, axis=-1)[..., ::hop, :]
+    return frames * get_window("hann", n_fft).astype(np.float32)
+
+def spectral_features_batch(ys, sr, n_fft=2048, hop=512, roll_percent=0.85):
+    """Mean spectral centroid and rolloff per clip, from one batched magnitude STFT.
+    Frames past each clip's own length are masked out, so values match a per-clip STFT."""
+    lens = np.array([len(y) for y in ys])
+    S = np.abs(np.fft.rfft(spectral_frames(pad_stack(ys, np.float32), n_fft, hop), axis=-1))
+    freqs = np.fft.rfftfreq(n_fft, 1/sr)
+    energy = S.sum(axis=-1)
+    centroid = (S @ freqs) / np.maximum(energy, 1e-12)
+    cum = np.cumsum(S, axis=-1)
+    rolloff = freqs[(cum >= roll_percent * energy[..., None]).argmax(axis=-1)]
+
+    n_frames = 1 + lens // hop
+    valid = np.arange(S.shape[1]) < n_frames[:, None]
+    return (
+        (centroid * valid).sum(axis=1) / n_frames,
+        (rolloff * valid).sum(axis=1) / n_frames,
+    )
+
+def measure_batch(ys, sr):
+    """RMS, centroid and rolloff for every clip, in input order.
+    Clips are grouped by similar length so padding (and STFT memory) stays small."""
+    rms_vals = np.zeros(len(ys))
+    centroids = np.zeros(len(ys))
+    rolloffs = np.zeros(len(ys))
+    order = sorted(range(len(ys)), key=lambda i: len(ys[i]))
+    for start in range(0, len(order), ASR_BATCH_SIZE):
+        bucket = order[start:start + ASR_BATCH_SIZE]
+        group = [ys[i] for i in bucket]
+        rms_vals[bucket] = rms_batch(group)
+        centroids[bucket], rolloffs[bucket] = spectral_features_batch(group, sr)
+    return rms_vals, centroids, rolloffs
 
 # =====================
 # EQ FUNCTIONS
 # =====================
+EQ_PRESETS = {
+    "rock": [(100, 300, 0.7), (4000, 8000, 0.5)],
+    "pop": [(200, 400, 0.5), (3000, 6000, 0.4)],
+    "jazz": [(250, 500, 0.5), (2000, 5000, 0.3)],
+    "classic": [(100, 400, 0.4), (2000, 6000, 0.2)],
+}
+
 def butter_bandpass(lowcut, highcut, fs, order=4):
     nyq = 0.5 * fs
     low = max(lowcut / nyq, 0.001)
     high = min(highcut / nyq, 0.999)
-    return butter(order, [low, high], btype="band")
+    return butter(order, [low, high], btype="band", output="sos")
+
+# Band filters are designed once here, not on every apply_eq call
+EQ_SOS = {
+    mode: [(butter_bandpass(lo, hi, TARGET_SR), gain) for lo, hi, gain in bands]
+    for mode, bands in EQ_PRESETS.items()
+}
 
-def apply_eq_filter(y, lowcut, highcut, gain):
-    b, a = butter_bandpass(lowcut, highcut, TARGET_SR)
-    return y + gain * lfilter(b, a, y)
+def apply_eq_filter(y, sos, gain):
+    return y + gain * sosfilt(sos, y)
 
 def apply_eq(y, mode):
-    if mode == "rock":
-        y = apply_eq_filter(y, 100, 300, 0.7)
-        y = apply_eq_filter(y, 4000, 8000, 0.5)
-    elif mode == "pop":
-        y = apply_eq_filter(y, 200, 400, 0.5)
-        y = apply_eq_filter(y, 3000, 6000, 0.4)
-    elif mode == "jazz":
-        y = apply_eq_filter(y, 250, 500, 0.5)
-        y = apply_eq_filter(y, 2000, 5000, 0.3)
-    elif mode == "classic":
-        y = apply_eq_filter(y, 100, 400, 0.4)
-        y = apply_eq_filter(y, 2000, 6000, 0.2)
+    for sos, gain in EQ_SOS.get(mode, []):
+        y = apply_eq_filter(y, sos, gain)
     return y
 
 # =====================
@@ -144,65 +313,335 @@ def cer(ref, hyp):
     hyp_n = normalize(hyp)
     if not ref_n:
         return 0.0
-    return editdistance.eval(ref_n, hyp_n) / max(1, len(ref_n))
+    return levenshtein(char_ids(ref_n), char_ids(hyp_n)) / max(1, len(ref_n))
 
 def wer(ref, hyp):
     ref_w = normalize(ref).split()
     hyp_w = normalize(hyp).split()
     if not ref_w:
         return 0.0
-    return editdistance.eval(ref_w, hyp_w) / max(1, len(ref_w))
+    return levenshtein(*word_ids(ref_w, hyp_w)) / max(1, len(ref_w))
 
 # =====================
 # ASR FUNCTIONS
 # =====================
+def whisper_features(y, sr, cache=True):
+    """Log-mel input features for one utterance, cached on disk by audio content
+    when MEL_CACHE_DIR is set."""
+    if not (cache and MEL_CACHE_DIR):
+        return whisper_processor(y, sampling_rate=sr, return_tensors="np").input_features[0]
+
+    key = hashlib.sha1(y.tobytes())
+    key.update(f"{y.dtype}:{sr}:{WHISPER_NAME}".encode())
+    path = os.path.join(MEL_CACHE_DIR, key.hexdigest() + ".npy")
+    if os.path.exists(path):
+        try:
+            mel = np.load(path)
+            os.utime(path)  # recency for eviction
+            return mel
+        except Exception:
+            pass
+
+    mel = whisper_processor(y, sampling_rate=sr, return_tensors="np").input_features[0]
+    try:
+        os.makedirs(MEL_CACHE_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, mel)
+        os.replace(tmp_path, path)
+        evict_mel_cache()
+    except OSError:
+        pass
+    return mel
+
+def evict_mel_cache():
+    """Delete the least recently used mel files until the cache fits in MEL_CACHE_MAX_MB."""
+    entries = []
+    for entry in os.scandir(MEL_CACHE_DIR):
+        if entry.name.endswith(".npy"):
+            st = entry.stat()
+            entries.append((st.st_mtime, st.st_size, entry.path))
+    total = sum(size for _, size, _ in entries)
+    limit = MEL_CACHE_MAX_MB * 1024 * 1024
+    for _, size, path in sorted(entries):
+        if total <= limit:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+        total -= size
+
 def asr_whisper(y, sr):
-    inputs = whisper_processor(y, sampling_rate=sr, return_tensors="pt").input_features.to(DEVICE)
-    with torch.no_grad():
-        ids = whisper_model.generate(
-            inputs,
-            forced_decoder_ids=forced_ids,
-            max_new_tokens=64
-        )
-    return whisper_processor.batch_decode(ids, skip_special_tokens=True)[0]
+    return asr_whisper_batch([y], sr)[0]
+
+def asr_whisper_batch(ys, sr, cache=True):
+    if USE_FASTER_WHISPER:
+        texts = []
+        for y in ys:
+            # Greedy like the Transformers path: no temperature fallback, no sampling
+            segments, _ = whisper_model.transcribe(
+                y,
+                language="en",
+                beam_size=1,
+                temperature=0.0,
+                condition_on_previous_text=False,
+                without_timestamps=True,
+            )
+            texts.append(" ".join(s.text.strip() for s in segments))
+        return texts
+
+    # Whisper always pads features to its 30 s window, so clips stack directly
+    mels = [whisper_features(y, sr, cache) for y in ys]
+    b = len(mels)
+    if feat_host is not None and b <= feat_host.shape[0]:
+        np.stack(mels, out=feat_host[:b].numpy())
+        feat_dev[:b].copy_(feat_host[:b], non_blocking=True)
+        inputs = feat_dev[:b]
+    else:
+        inputs = torch.from_numpy(np.stack(mels)).to(DEVICE, dtype=WHISPER_DTYPE)
+    with torch.inference_mode(), torch.autocast(AUTOCAST_DEVICE, dtype=WHISPER_DTYPE, enabled=WHISPER_AUTOCAST):
+        ids = whisper_model.generate(inputs, generation_config=whisper_gen_config)
+    return whisper_processor.batch_decode(ids, skip_special_tokens=True)
 
 def asr_wav2vec2(y, sr):
-    inp = w2v_processor(y, sampling_rate=sr, return_tensors="pt").input_values.to(DEVICE)
-    with torch.no_grad():
+    inp = w2v_processor(y, sampling_rate=sr, return_tensors="pt").input_values
+    inp = inp.to(DEVICE, dtype=MODEL_DTYPE)
+    with torch.inference_mode(), torch.autocast(AUTOCAST_DEVICE, dtype=MODEL_DTYPE, enabled=USE_AUTOCAST):
         logits = w2v_model(inp).logits
     pred = torch.argmax(logits, dim=-1)
     return w2v_processor.batch_decode(pred)[0]
 
+def asr_wav2vec2_batch(ys, sr):
+    # One clip per forward pass: wav2vec2-base normalizes each input over its whole
+    # length (feature extractor and GroupNorm conv), so zero padding would change the text
+    return [asr_wav2vec2(y, sr) for y in ys]
+
 def asr_vosk(y, sr):
-    rec = KaldiRecognizer(vosk_model, sr)
-    rec.SetWords(False)
+    rec = get_vosk_rec(sr)
 
-    data = (y * 32767).astype(np.int16).tobytes()
-    step = 4000
-    for i in range(0, len(data), step):
-        rec.AcceptWaveform(data[i:i+step])
+    # float -> PCM16 in one vectorized pass, fed to Kaldi in a single call
+    scaled = np.empty_like(y)
+    np.multiply(y, 32767.0, out=scaled)
+    np.clip(scaled, -32768, 32767, out=scaled)
+    pcm16 = scaled.astype(np.int16)
+    rec.AcceptWaveform(pcm16.tobytes())
 
     out = json.loads(rec.FinalResult())
     return out.get("text", "")
 
+ASR_BATCH_FUNCS = {
+    "whisper": asr_whisper_batch,
+    "wav2vec2": asr_wav2vec2_batch,
+}
+
+def transcribe_all(asr_backend, ys, utt_ids, logs):
+    """Transcribe every utterance, batching the neural backends by similar length."""
+    hyps = [""] * len(ys)
+
+    if asr_backend == "vosk":
+        for i, y in enumerate(ys):
+            try:
+                hyps[i] = asr_vosk(y, TARGET_SR)
+            except Exception as ex:
+                logs.append(f"[ASR] failed for {utt_ids[i]}: {ex}")
+        return hyps
+
+    batch_fn = ASR_BATCH_FUNCS.get(asr_backend)
+    if batch_fn is None:
+        logs.append(f"[ASR] Unknown backend: {asr_backend}")
+        return hyps
+
+    compile_backend(asr_backend, logs)
+
+    order = sorted(range(len(ys)), key=lambda i: len(ys[i]))
+    for start in range(0, len(order), ASR_BATCH_SIZE):
+        bucket = order[start:start + ASR_BATCH_SIZE]
+        try:
+            texts = run_batch(asr_backend, batch_fn, [ys[i] for i in bucket], logs)
+        except Exception as ex:
+            for i in bucket:
+                logs.append(f"[ASR] failed for {utt_ids[i]}: {ex}")
+            continue
+        for i, text in zip(bucket, texts):
+            hyps[i] = text
+    return hyps
+
+# =====================
+# TORCH.COMPILE + WARMUP
+# =====================
+# Eager models swapped out by compile_backend(), per backend
+_eager_models = {}
+_compile_tried = set()
+
+def compile_backend(asr_backend, logs):
+    """Compile the Transformers model behind `asr_backend` on first use (TORCH_COMPILE=1)
+    and warm it up at real batch shapes. Stays eager if compilation fails."""
+    global w2v_model
+    # MPS support in Inductor is partial
+    if not TORCH_COMPILE or not hasattr(torch, "compile") or DEVICE == "mps":
+        return
+    if asr_backend in _compile_tried:
+        return
+    _compile_tried.add(asr_backend)
+
+    # dynamic=True: batch size, Wav2Vec2 input length and the Whisper KV cache all vary
+    if asr_backend == "whisper":
+        # bitsandbytes layers do not trace; faster-whisper is not a torch model
+        if USE_FASTER_WHISPER or getattr(whisper_model, "is_quantized", False):
+            return
+        model = whisper_model.model
+        _eager_models["whisper"] = (model.encoder, model.decoder)
+        model.encoder = torch.compile(model.encoder, dynamic=True)
+        model.decoder = torch.compile(model.decoder, dynamic=True)
+        warmup = [np.zeros(30 * TARGET_SR, dtype=np.float32)] * ASR_BATCH_SIZE
+    elif asr_backend == "wav2vec2":
+        _eager_models["wav2vec2"] = w2v_model
+        w2v_model = torch.compile(w2v_model, dynamic=True)
+        warmup = [np.zeros(3 * TARGET_SR, dtype=np.float32)]
+    else:
+        return
+
+    try:
+        if asr_backend == "whisper":
+            asr_whisper_batch(warmup, TARGET_SR, cache=False)
+        else:
+            asr_wav2vec2_batch(warmup, TARGET_SR)
+        logs.append(f"[compile] {asr_backend} compiled")
+    except Exception as ex:
+        restore_eager(asr_backend)
+        logs.append(f"[compile] {asr_backend} kept eager: {ex}")
+
+def restore_eager(asr_backend):
+    """Put back the eager model replaced by compile_backend(). False if it was not compiled."""
+    global w2v_model
+    eager = _eager_models.pop(asr_backend, None)
+    if eager is None:
+        return False
+    if asr_backend == "whisper":
+        whisper_model.model.encoder, whisper_model.model.decoder = eager
+    else:
+        w2v_model = eager
+    return True
+
+def run_batch(asr_backend, batch_fn, ys, logs):
+    """Run one ASR batch; a compiled model failing at runtime is dropped for eager and retried."""
+    try:
+        return batch_fn(ys, TARGET_SR)
+    except Exception as ex:
+        if not restore_eager(asr_backend):
+            raise
+        logs.append(f"[compile] {asr_backend} failed at runtime, back to eager: {ex}")
+        return batch_fn(ys, TARGET_SR)
+
+# =====================
+# PLOT
+# =====================
+def _ticks(lo, hi, n=5):
+    return [lo + (hi - lo) * i / (n - 1) for i in range(n)]
+
+def mini_plot_png(xs, ys, title, xlabel, ylabel, size=(480, 320)):
+    """Line plot with markers and a grid, drawn with Pillow; returns base64 PNG."""
+    W, H = size
+    left, right, top, bottom = 64, 20, 32, 48
+    font = ImageFont.load_default()
+    img = Image.new("RGB", size, "white")
+    d = ImageDraw.Draw(img)
+
+    xs = [float(x) for x in xs]
+    ys = [float(y) for y in ys]
+    x0, x1 = (min(xs), max(xs)) if xs else (0.0, 1.0)
+    y0, y1 = (min(ys), max(ys)) if ys else (0.0, 1.0)
+    if x1 == x0:
+        x0, x1 = x0 - 0.5, x1 + 0.5
+    if y1 == y0:
+        y0, y1 = y0 - 0.05, y1 + 0.05
+    # 5% margin like matplotlib's autoscale
+    dx, dy = (x1 - x0) * 0.05, (y1 - y0) * 0.05
+    x0, x1, y0, y1 = x0 - dx, x1 + dx, y0 - dy, y1 + dy
+
+    def px(x, y):
+        return (
+            left + (x - x0) / (x1 - x0) * (W - left - right),
+            H - bottom - (y - y0) / (y1 - y0) * (H - top - bottom),
+        )
+
+    # Grid + tick labels
+    for tx in _ticks(x0 + dx, x1 - dx):
+        gx, _ = px(tx, y0)
+        d.line([(gx, top), (gx, H - bottom)], fill="#dddddd")
+        label = f"{tx:g}"
+        d.text((gx - d.textlength(label, font=font) / 2, H - bottom + 4), label, fill="black", font=font)
+    for ty in _ticks(y0 + dy, y1 - dy):
+        _, gy = px(x0, ty)
+        d.line([(left, gy), (W - right, gy)], fill="#dddddd")
+        label = f"{ty:.3g}"
+        d.text((left - 6 - d.textlength(label, font=font), gy - 5), label, fill="black", font=font)
+    d.rectangle([left, top, W - right, H - bottom], outline="black")
+
+    # Series
+    pts = [px(x, y) for x, y in zip(xs, ys)]
+    if len(pts) > 1:
+        d.line(pts, fill="#1f77b4", width=2)
+    for cx, cy in pts:
+        d.ellipse([cx - 4, cy - 4, cx + 4, cy + 4], fill="#1f77b4")
+
+    # Labels
+    d.text(((W - d.textlength(title, font=font)) / 2, 10), title, fill="black", font=font)
+    d.text(((W - d.textlength(xlabel, font=font)) / 2, H - 20), xlabel, fill="black", font=font)
+    ylab = Image.new("RGB", (int(d.textlength(ylabel, font=font)) + 2, 12), "white")
+    ImageDraw.Draw(ylab).text((1, 0), ylabel, fill="black", font=font)
+    ylab = ylab.rotate(90, expand=True)
+    img.paste(ylab, (8, (H - ylab.height) // 2))
+
+    buf = io.BytesIO()
+    img.save(buf, "PNG", optimize=True)
+    return base64.b64encode(buf.getvalue()).decode()
+
 # =====================
 # MAIN EVALUATION
 # =====================
+def prepare_one(idx, r, do_eq, eq_mode, logs):
+    """Load and equalize one metadata row (runs in a worker thread)."""
+    utt_id = str(r.get("utt_id", f"utt_{idx}"))
+    abspath = str(r.get("abspath", ""))
+
+    y, sr = load_audio(abspath, logs)
+    if do_eq and eq_mode and eq_mode != "none":
+        try:
+            y = apply_eq(y, eq_mode)
+        except Exception as ex:
+            logs.append(f"[EQ] failed for {utt_id}: {ex}")
+
+    dist = r.get("distance_m", 0.0)
+    try:
+        dist = float(dist)
+    except Exception:
+        dist = 0.0
+
+    return {
+        "idx": idx,
+        "utt_id": utt_id,
+        "y": y,
+        "sr": sr,
+        "dist": dist,
+    }
+
 def run_evaluation(asr_backend, data_root, eq_mode, do_eq, condition):
     logs = []
     logs.append(f"[config] backend={asr_backend} condition={condition} doEq={do_eq} eqMode={eq_mode}")
     logs.append(f"[config] data_root={data_root} DEVICE={DEVICE} TARGET_SR={TARGET_SR}")
+    logs.append(f"[config] whisper={WHISPER_ENGINE} WHISPER_QUANT={WHISPER_QUANT}")
     logs.append(f"backend={asr_backend}, condition={condition}, doEq={do_eq}, eqMode={eq_mode}")
     logs.append(f"data_root={data_root}")
     meta_path = os.path.join(data_root, "metadata.csv")
     if not os.path.exists(meta_path):
         return {"error": f"metadata.csv not found at: {meta_path}", "logs": "\n".join(logs)}
 
-    df = pd.read_csv(meta_path)
-    if "relpath" not in df.columns or "utt_id" not in df.columns or "condition" not in df.columns:
-        return {"error": f"metadata.csv missing required columns. Found: {list(df.columns)}", "logs": "\n".join(logs)}
-
-    df["abspath"] = df["relpath"].apply(lambda p: os.path.join(data_root, str(p)))
+    try:
+        df = load_metadata(data_root, meta_path)
+    except ValueError as ex:
+        return {"error": str(ex), "logs": "\n".join(logs)}
 
     # Human references
     if "text" in df.columns:
@@ -226,51 +665,39 @@ def run_evaluation(asr_backend, data_root, eq_mode, do_eq, condition):
         }
         return empty
 
-    rows = []
-
-    for idx, r in subset.iterrows():
-        utt_id = str(r.get("utt_id", f"utt_{idx}"))
-        abspath = str(r.get("abspath", ""))
+    # Load + EQ and the batched features run in worker threads (NumPy/soundfile/scipy
+    # release the GIL). The next window is queued before ASR on the current one, so disk
+    # and DSP overlap with ASR while at most two windows of audio are held in memory.
+    records = list(zip(subset.index, subset.to_dict("records")))
+    window = ASR_BATCH_SIZE * 4
+    chunks = [records[i:i + window] for i in range(0, len(records), window)]
 
-        y, sr = load_audio(abspath, logs)
-        if do_eq and eq_mode and eq_mode != "none":
-            try:
-                y = apply_eq(y, eq_mode)
-            except Exception as ex:
-                logs.append(f"[EQ] failed for {utt_id}: {ex}")
-
-        ref = refs.get(utt_id, "")
-        hyp = ""
-        try:
-            if asr_backend == "whisper":
-                hyp = asr_whisper(y, sr)
-            elif asr_backend == "wav2vec2":
-                hyp = asr_wav2vec2(y, sr)
-            elif asr_backend == "vosk":
-                hyp = asr_vosk(y, sr)
-            else:
-                logs.append(f"[ASR] Unknown backend: {asr_backend}")
-        except Exception as ex:
-            logs.append(f"[ASR] failed for {utt_id}: {ex}")
-            hyp = ""
-
-        c, ro = spectral_features(y, sr)
-
-        dist = r.get("distance_m", 0.0)
-        try:
-            dist = float(dist)
-        except Exception:
-            dist = 0.0
-
-        rows.append({
-            "utt_id": f"{utt_id}_{idx}",
-            "distance_m": dist,
-            "CER": float(cer(ref, hyp)),
-            "WER": float(wer(ref, hyp)),
-            "RMS": float(rms(y)),
-            "centroid": float(c),
-            "rolloff": float(ro),
-        })
+    rows = []
+    with ThreadPoolExecutor(max_workers=PREP_WORKERS) as pool:
+        def submit(chunk):
+            return [pool.submit(prepare_one, idx, r, do_eq, eq_mode, logs) for idx, r in chunk]
+
+        pending = submit(chunks[0])
+        for k in range(len(chunks)):
+            items = [f.result() for f in pending]
+            pending = submit(chunks[k + 1]) if k + 1 < len(chunks) else []
+
+            ys = [it["y"] for it in items]
+            measures = pool.submit(measure_batch, ys, TARGET_SR)
+            hyps = transcribe_all(asr_backend, ys, [it["utt_id"] for it in items], logs)
+            rms_vals, centroids, rolloffs = measures.result()
+
+            for it, hyp, rms_val, c, ro in zip(items, hyps, rms_vals, centroids, rolloffs):
+                ref = refs.get(it["utt_id"], "")
+                rows.append({
+                    "utt_id": f"{it['utt_id']}_{it['idx']}",
+                    "distance_m": it["dist"],
+                    "CER": float(cer(ref, hyp)),
+                    "WER": float(wer(ref, hyp)),
+                    "RMS": float(rms_val),
+                    "centroid": float(c),
+                    "rolloff": float(ro),
+                })
 
     df_det = pd.DataFrame(rows).fillna(0.0)
 
@@ -281,16 +708,13 @@ def run_evaluation(asr_backend, data_root, eq_mode, do_eq, condition):
     # Plot CER vs Distance
     plot_b64 = ""
     try:
-        fig, ax = plt.subplots()
-        ax.plot(df_sum["distance_m"], df_sum["CER"], marker="o")
-        ax.set_xlabel("Distance (m)")
-        ax.set_ylabel("CER")
-        ax.set_title(f"CER vs Distance ({asr_backend})")
-        ax.grid(True)
-        buf = io.BytesIO()
-        fig.savefig(buf, format="png", bbox_inches="tight")
-        plt.close(fig)
-        plot_b64 = base64.b64encode(buf.getvalue()).decode()
+        plot_b64 = mini_plot_png(
+            df_sum["distance_m"],
+            df_sum["CER"],
+            f"CER vs Distance ({asr_backend})",
+            "Distance (m)",
+            "CER",
+        )
     except Exception as ex:
         logs.append(f"[plot] failed: {ex}")
         plot_b64 = ""
@@ -307,10 +731,10 @@ def run_evaluation(asr_backend, data_root, eq_mode, do_eq, condition):
 # ENTRY POINT
 # =====================
 if __name__ == "__main__":
-    try:
-        inp = json.load(sys.stdin)
-
-        result = run_evaluation(
+    # Persistent worker: one JSON request per line on stdin, one JSON response per line
+    # on stdout, tagged with the request "id". Models stay loaded between requests.
+    def handle(inp):
+        return run_evaluation(
             inp.get("asrBackend", "whisper"),
             inp.get("dataRoot", os.getcwd()),
             inp.get("eqMode", "none"),
@@ -318,10 +742,4 @@ if __name__ == "__main__":
             inp.get("asrOnCondition", "speaker_3m"),
         )
 
-        sys.stdout.write(json.dumps(result))
-        sys.stdout.flush()
-
-    except Exception as e:
-        sys.stdout.write(json.dumps({"error": str(e), "logs": f"[entry] {e}"}))
-        sys.stdout.flush()
-        sys.exit(0)
+    serve(handle, RESPONSE_OUT)
@@ -0,0 +1,29 @@
+"""
+Check that batched Whisper decoding (padded generate()) gives the same text as one clip at a time.
+Run from the project root: python scripts/test_batching.py
+"""
+import os
+import sys
+
+# faster-whisper decodes clip by clip: force the batched Transformers path
+os.environ.setdefault("WHISPER_BACKEND", "hf")
+import evaluate as ev
+
+DATA_ROOT = os.environ.get("DATA_ROOT", "loudspeaker_asr_dataset")
+
+# Mixed-length clips: every condition of the first utterances
+df = ev.load_metadata(DATA_ROOT, os.path.join(DATA_ROOT, "metadata.csv"))
+logs = []
+ys = [ev.load_audio(p, logs)[0] for p in df["abspath"].head(ev.ASR_BATCH_SIZE)]
+print("Clip lengths:", sorted(len(y) for y in ys))
+
+failed = False
+batched = ev.asr_whisper_batch(ys, ev.TARGET_SR)
+for i, y in enumerate(ys):
+    alone = ev.asr_whisper(y, ev.TARGET_SR)
+    if batched[i] != alone:
+        failed = True
+        print(f"❌ whisper clip {i}: batch={batched[i]!r} alone={alone!r}")
+print(f"✅ whisper checked on {len(ys)} clips")
+
+sys.exit(1 if failed else 0)
@@ -0,0 +1,43 @@
+"""
+Levenshtein distance on token-id arrays, shared by analyze.py and evaluate.py for CER / WER.
+Compiled with numba when installed, otherwise the editdistance C extension;
+importing this module fails if neither is available.
+"""
+
+import numpy as np
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+    import editdistance
+
+def char_ids(s):
+    # Unicode code points as int32
+    return np.frombuffer(s.encode("utf-32-le"), dtype=np.uint32).astype(np.int32)
+
+def word_ids(ref_w, hyp_w):
+    # Per-pair vocabulary: word -> int32 id
+    vocab = {}
+    ref = np.array([vocab.setdefault(w, len(vocab)) for w in ref_w], dtype=np.int32)
+    hyp = np.array([vocab.setdefault(w, len(vocab)) for w in hyp_w], dtype=np.int32)
+    return ref, hyp
+
+if njit is not None:
+    @njit(cache=True)
+    def levenshtein(a, b):
+        """Edit distance between two int32 token-id arrays (Wagner-Fischer, two rows)."""
+        m, n = len(a), len(b)
+        prev = np.arange(n + 1).astype(np.int32)
+        cur = np.empty(n + 1, dtype=np.int32)
+        for i in range(1, m + 1):
+            cur[0] = i
+            for j in range(1, n + 1):
+                cost = 0 if a[i - 1] == b[j - 1] else 1
+                cur[j] = min(prev[j] + 1, cur[j - 1] + 1, prev[j - 1] + cost)
+            prev, cur = cur, prev
+        return prev[n]
+else:
+    def levenshtein(a, b):
+        """Edit distance between two int32 token-id arrays."""
+        return editdistance.eval(a.tolist(), b.tolist())
@@ -0,0 +1,60 @@
+"""
+JSON-lines request / response loop shared by the persistent analyze.py and evaluate.py workers.
+Call redirect_stdout() before the heavy imports, then serve() once the models are loaded.
+"""
+
+import json
+import os
+import sys
+
+def redirect_stdout():
+    """Keep a private copy of stdout for responses and point fd 1 / sys.stdout at stderr,
+    so nothing printed by Python or native code can corrupt the response stream."""
+    out = os.fdopen(os.dup(1), "w")
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    return out
+
+def read_requests(stream):
+    """Yield JSON requests from `stream`: one per line, or a document spread over several
+    lines (pretty-printed input). Malformed input is yielded as its ValueError and skipped."""
+    buf = ""
+    for line in iter(stream.readline, ""):
+        if not buf and not line.strip():
+            continue
+        buf += line
+        while buf:
+            try:
+                request = json.loads(buf)
+            except ValueError as ex:
+                # Error at the very end: the document is incomplete, wait for more lines
+                if getattr(ex, "pos", 0) >= len(buf.rstrip()):
+                    break
+                yield ex
+                # Earlier lines were the broken part: give this line its own chance
+                buf = line if buf != line and line.strip() else ""
+                continue
+            yield request
+            buf = ""
+    if buf.strip():
+        try:
+            json.loads(buf)
+        except ValueError as ex:
+            yield ex
+
+def serve(handle, out, stream=None):
+    """Answer each request with handle(request): one JSON line on `out`, tagged with the
+    request "id" so the caller can match it."""
+    for request in read_requests(stream or sys.stdin):
+        req_id = None
+        try:
+            if isinstance(request, Exception):
+                raise request
+            req_id = request.get("id")
+            result = handle(request)
+        except Exception as e:
+            result = {"error": str(e), "logs": f"[entry] {e}"}
+        if req_id is not None:
+            result["id"] = req_id
+        out.write(json.dumps(result) + "\n")
+        out.flush()